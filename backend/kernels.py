@@ -0,0 +1,70 @@
+import threading
+import numpy as np
+
+try:
+    import numba
+    from numba import njit, prange
+except ImportError:  # JIT kernels are optional; callers fall back to NumPy
+    njit = None
+else:
+    # Searches run concurrently on the executor threadpool. The workqueue
+    # layer aborts the process on concurrent parallel calls, so insist on a
+    # threadsafe layer (TBB or OpenMP); if none is available, warm_up()
+    # fails at startup instead of a request crashing the worker.
+    numba.config.THREADING_LAYER = "threadsafe"
+
+available = njit is not None
+
+# dimension -> kernel compiled with that row length baked in
+_dot_scores_kernels = {}
+_lock = threading.Lock()
+
+
+def _make_dot_scores(dimension):
+    @njit(parallel=True, fastmath=True)
+    def dot_scores(matrix, query, out):
+        """
+        out[i] = matrix[i] . query, rows split across cores. `dimension` is
+        a closure constant, so the inner trip count is known at compile time
+        and LLVM can fully unroll it into AVX2/AVX-512 FMA chains (fastmath
+        allows the reassociation).
+        """
+        for i in prange(matrix.shape[0]):
+            s = np.float32(0.0)
+            for d in range(dimension):
+                s += matrix[i, d] * query[d]
+            out[i] = s
+
+    return dot_scores
+
+
+def dot_scores_for(dimension):
+    """
+    The dot_scores kernel specialized for rows of `dimension` floats.
+    Numba further specializes it per argument dtype on first call.
+    Callers must pass a matrix whose rows are exactly `dimension` long.
+    """
+    with _lock:
+        kernel = _dot_scores_kernels.get(dimension)
+        if kernel is None:
+            kernel = _make_dot_scores(dimension)
+            _dot_scores_kernels[dimension] = kernel
+    return kernel
+
+
+def warm_up(dimension):
+    """
+    Trigger JIT compilation so the first real query doesn't pay for it.
+    """
+    if not available:
+        return
+
+    # Numba specializes on writability: the matrix is read-only when
+    # memory-mapped from disk, and cached query embeddings always are
+    dot_scores = dot_scores_for(dimension)
+    query = np.zeros(dimension, dtype=np.float32)
+    query.setflags(write=False)
+    for writable in (True, False):
+        matrix = np.zeros((2, dimension), dtype=np.float32)
+        matrix.setflags(write=writable)
+        dot_scores(matrix, query, np.empty(2, dtype=np.float32))
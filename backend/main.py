@@ -1,11 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from rag import RAGSystem
 import uvicorn
+import json
 import os
 
-app = FastAPI()
+# Built once per worker on startup rather than at import time, so importing
+# this module (tests, tooling) doesn't load the embedding model
+rag = None
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global rag
+    # If construction raises, the error propagates as-is: there is no
+    # client to close yet, so shutdown never touches a None rag
+    rag = RAGSystem()
+    try:
+        yield
+    finally:
+        await rag.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,8 +35,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-rag = RAGSystem()
-
 
 class QueryRequest(BaseModel):
     query: str
@@ -25,25 +43,39 @@ class QueryRequest(BaseModel):
 
 
 @app.get("/")
-def health():
+async def health():
     return {"status": "RAG service running"}
 
 
 @app.get("/stats")
-def get_stats():
+async def get_stats():
     return {
-        "total_documents": len(rag.vector_db.documents),
+        "total_documents": len(rag.vector_db),
         "dimension": rag.vector_db.dimension
     }
 
 
 @app.post("/query")
-def query_rag(req: QueryRequest):
-    return rag.query(
+async def query_rag(req: QueryRequest):
+    return await rag.query(
+        req.query,
+        k=req.k,
+        max_length=req.max_length
+    )
+
+
+@app.post("/query/stream")
+async def query_rag_stream(req: QueryRequest):
+    # Newline-delimited JSON: retrieved documents first, then one line per token
+    events = rag.stream_query(
         req.query,
         k=req.k,
         max_length=req.max_length
     )
+    return StreamingResponse(
+        (json.dumps(event) + "\n" async for event in events),
+        media_type="application/x-ndjson"
+    )
 
 
 if __name__ == "__main__":
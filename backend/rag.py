@@ -1,13 +1,35 @@
 from vector_db import VectorDB
-import requests
+from semantic_cache import SemanticCache
+import asyncio
+import httpx
+import json
 import os
 
+# Static instruction block shared by every prompt; only the context and
+# question are appended per request
+PROMPT_PREFIX = """
+Use the context below to answer the question.
+
+Context:
+"""
+
+# return_full_text=False makes the endpoint send back only the newly
+# generated tokens, so the prompt never has to be stripped from the answer
+GENERATION_PARAMETERS = {
+    "temperature": 0.7,
+    "return_full_text": False
+}
+
 
 class RAGSystem:
     def __init__(self):
         self.vector_db = VectorDB()
         self.vector_db.load_documents()
 
+        # Answers for recent queries, matched by embedding similarity so
+        # paraphrases of a question skip the LLM call
+        self.answer_cache = SemanticCache(self.vector_db.dimension)
+
         # ✅ Keep using the current endpoint since you said you can't switch
         self.api_url = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.2"
 
@@ -16,8 +38,17 @@ class RAGSystem:
             "Content-Type": "application/json"
         }
 
-    def query(self, query: str, k: int = 3, max_length: int = 150):
-        docs = self.vector_db.search(query)[:k]
+        # Shared keep-alive connection pool; awaiting it never blocks the
+        # event loop, so one worker can have many generations in flight
+        self.client = httpx.AsyncClient(headers=self.headers, timeout=60)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def query(self, query: str, k: int = 3, max_length: int = 150):
+        query_embedding, cached, docs = await self._retrieve(query, k, max_length)
+        if cached is not None:
+            return cached
 
         if not docs:
             return {
@@ -25,34 +56,9 @@ class RAGSystem:
                 "retrieved_documents": []
             }
 
-        context = "\n".join(
-            doc["metadata"]["text"] for doc in docs
-        )
-
-        prompt = f"""
-Use the context below to answer the question.
-
-Context:
-{context}
-
-Question:
-{query}
-
-Answer:
-"""
-
-        response = requests.post(
+        response = await self.client.post(
             self.api_url,
-            headers=self.headers,
-            json={
-                "inputs": prompt,
-                "parameters": {
-                    "max_new_tokens": max_length,
-                    "temperature": 0.7,
-                    "return_full_text": False
-                }
-            },
-            timeout=60
+            json=self._generation_payload(query, docs, max_length)
         )
 
         # ✅ Safe JSON parsing
@@ -71,7 +77,95 @@ Answer:
         else:
             answer = ""
 
-        return {
+        result = {
             "answer": answer,
             "retrieved_documents": docs
         }
+
+        # Only successful generations are worth replaying
+        if answer:
+            self.answer_cache.put(query_embedding, (k, max_length), result)
+
+        return result
+
+    async def stream_query(self, query: str, k: int = 3, max_length: int = 150):
+        """
+        Streaming variant of query(). Yields events as they become available:
+        first {"retrieved_documents": [...]}, then {"token": "..."} for each
+        generated token as the HF endpoint streams it back.
+        """
+        query_embedding, cached, docs = await self._retrieve(query, k, max_length)
+        if cached is not None:
+            yield {"retrieved_documents": cached["retrieved_documents"]}
+            yield {"token": cached["answer"]}
+            return
+
+        yield {"retrieved_documents": docs}
+
+        if not docs:
+            yield {"token": "No documents available."}
+            return
+
+        tokens = []
+        async with self.client.stream(
+            "POST",
+            self.api_url,
+            json=self._generation_payload(query, docs, max_length, stream=True)
+        ) as response:
+            # Server-sent events: one "data: {...}" line per token
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    event = json.loads(line[len("data:"):])
+                except ValueError:
+                    continue
+
+                token = event.get("token") or {}
+                if token.get("special") or not token.get("text"):
+                    continue
+
+                tokens.append(token["text"])
+                yield {"token": token["text"]}
+
+        answer = "".join(tokens)
+        if answer:
+            self.answer_cache.put(query_embedding, (k, max_length), {
+                "answer": answer,
+                "retrieved_documents": docs
+            })
+
+    async def _retrieve(self, query, k, max_length):
+        """
+        Embed the query and check the answer cache, falling back to vector
+        search. The BGE forward pass and the scan are CPU-bound, so they run
+        on the default threadpool instead of the event loop.
+        Returns (query_embedding, cached_response_or_None, docs).
+        """
+        loop = asyncio.get_running_loop()
+        query_embedding = await loop.run_in_executor(
+            None, self.vector_db.encode_query, query
+        )
+
+        cached = self.answer_cache.get(query_embedding, (k, max_length))
+        if cached is not None:
+            return query_embedding, cached, cached["retrieved_documents"]
+
+        docs = await loop.run_in_executor(
+            None, self.vector_db.search_by_vector, query_embedding, k
+        )
+        return query_embedding, None, docs
+
+    def _generation_payload(self, query, docs, max_length, stream=False):
+        context = "\n".join(
+            doc["metadata"]["text"] for doc in docs
+        )
+
+        return {
+            "inputs": PROMPT_PREFIX + context + "\n\nQuestion:\n" + query + "\n\nAnswer:\n",
+            "parameters": {
+                **GENERATION_PARAMETERS,
+                "max_new_tokens": max_length
+            },
+            "stream": stream
+        }
@@ -0,0 +1,55 @@
+import threading
+import numpy as np
+
+
+class SemanticCache:
+    def __init__(self, dimension, max_size=1024, threshold=0.95):
+        """
+        Bounded LRU cache of responses keyed by unit-normalized query
+        embeddings. A lookup hits when a cached query has cosine similarity
+        >= threshold with the new one and was made with the same params.
+        """
+        self.max_size = max_size
+        self.threshold = threshold
+
+        # Preallocated slots: one embedding row, params and value per entry
+        self.embeddings = np.zeros((max_size, dimension), dtype=np.float32)
+        self.params = [None] * max_size
+        self.values = [None] * max_size
+        self.last_used = np.zeros(max_size, dtype=np.int64)
+        self.size = 0
+
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def get(self, query_embedding, params):
+        with self._lock:
+            if self.size == 0:
+                return None
+
+            scores = self.embeddings[:self.size] @ query_embedding
+            candidates = np.flatnonzero(scores >= self.threshold)
+
+            # Best match first among the (few) entries above the threshold
+            for slot in candidates[np.argsort(-scores[candidates])]:
+                if self.params[slot] == params:
+                    self._clock += 1
+                    self.last_used[slot] = self._clock
+                    return self.values[slot]
+
+            return None
+
+    def put(self, query_embedding, params, value):
+        with self._lock:
+            if self.size < self.max_size:
+                slot = self.size
+                self.size += 1
+            else:
+                # Evict the least recently used entry
+                slot = int(np.argmin(self.last_used))
+
+            self._clock += 1
+            self.embeddings[slot] = query_embedding
+            self.params[slot] = params
+            self.values[slot] = value
+            self.last_used[slot] = self._clock
@@ -1,24 +1,236 @@
+import hashlib
 import json
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 import numpy as np
+import torch
 from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+import kernels
+
+logger = logging.getLogger(__name__)
+
+try:
+    import simsimd
+except ImportError:  # SIMD kernels are optional; fall back to NumPy
+    simsimd = None
+
+try:
+    import ml_dtypes
+except ImportError:  # only needed for bfloat16 storage
+    ml_dtypes = None
+
+try:
+    import faiss
+except ImportError:  # ANN index is optional; search falls back to a full scan
+    faiss = None
+
+
+def _quantize_int8(vectors):
+    """
+    Symmetric per-row int8 quantization: each row is scaled so its largest
+    absolute component maps to 127. An all-zero row quantizes to zeros.
+    """
+    scales = np.abs(vectors).max(axis=-1, keepdims=True) / 127.0
+    scales = np.where(scales == 0, 1.0, scales)
+    return np.round(vectors / scales).astype(np.int8)
+
+
+def _resolve_kernel(kernel):
+    """
+    Pick the similarity kernel: "simsimd", "numba" or "numpy", or "auto" for
+    the fastest one that is importable.
+    """
+    if kernel == "auto":
+        if simsimd is not None:
+            return "simsimd"
+        if kernels.available:
+            return "numba"
+        return "numpy"
+
+    if kernel == "simsimd" and simsimd is None:
+        raise ValueError("kernel='simsimd' requested but simsimd is not installed")
+    if kernel == "numba" and not kernels.available:
+        raise ValueError("kernel='numba' requested but numba is not installed")
+    if kernel not in ("simsimd", "numba", "numpy"):
+        raise ValueError(f"Unknown similarity kernel: {kernel}")
+    return kernel
+
+
+def _upcast_scores(matrix, query, block_rows):
+    """
+    Dot products for a low-precision (float16/bfloat16) matrix with no native
+    kernel: upcast one slab of rows at a time and run a float32 GEMV on it,
+    so the float32 slab and the query stay in cache while DRAM only streams
+    the compact rows.
+    """
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = matrix[start:start + block_rows].astype(np.float32)
+        scores[start:start + block_rows] = block @ query
+    return scores
+
+
+# faiss wants ~39 training points per centroid; PQ has 256 per subspace
+PQ_MIN_TRAINING_POINTS = 39 * 256
+
+# Number of set bits in each possible byte value
+_POPCOUNT = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1
+).sum(axis=1).astype(np.uint8)
+
+
+def _top_k(scores, k):
+    """
+    Indices of the k highest scores, highest first. O(N) partial selection
+    followed by a sort of only the k survivors.
+    """
+    if k >= len(scores):
+        return np.argsort(-scores)
+
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(-scores[top])]
+
+
+MODEL_NAME = "BAAI/bge-small-en-v1.5"
+ONNX_INT8_DIR = "bge-small-onnx-int8"
+ONNX_INT8_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+
+def _load_model(backend):
+    """
+    Load the embedding model for the given backend:
+    - "torch": HF Transformers + PyTorch
+    - "onnx": ONNX Runtime export of the same weights
+    - "onnx-int8": ONNX Runtime with int8 dynamically quantized matmuls
+      (exported once into ONNX_INT8_DIR and reused on later starts)
+    The ONNX backends need the sentence-transformers[onnx] extra.
+    """
+    if backend == "torch":
+        return SentenceTransformer(MODEL_NAME)
+    if backend == "onnx":
+        return SentenceTransformer(MODEL_NAME, backend="onnx")
+    if backend != "onnx-int8":
+        raise ValueError(f"Unknown embedding backend: {backend}")
+
+    if not os.path.exists(os.path.join(ONNX_INT8_DIR, ONNX_INT8_FILE)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        model = SentenceTransformer(MODEL_NAME, backend="onnx")
+        model.save(ONNX_INT8_DIR)
+        export_dynamic_quantized_onnx_model(model, "avx512_vnni", ONNX_INT8_DIR)
+
+    return SentenceTransformer(
+        ONNX_INT8_DIR,
+        backend="onnx",
+        model_kwargs={"file_name": ONNX_INT8_FILE},
+    )
 
 
 class VectorDB:
-    def __init__(self):
-        # Load embedding model
-        self.model = SentenceTransformer("BAAI/bge-small-en-v1.5")
+    """
+    Flat in-memory vector store over documents.json.
+    Invariant: every row of self.embeddings (and every query embedding) is
+    unit-normalized when it is encoded, so cosine similarity is exactly the
+    dot product and no search path divides by norms.
+    """
+
+    # Per-core L2 size used to tile upcasting scans; tune per deployment
+    l2_cache_bytes = 256 * 1024
+
+    def __init__(
+        self,
+        dtype="float32",
+        index="hnsw",
+        ann_threshold=5000,
+        nprobe=8,
+        pq_m=48,
+        backend="torch",
+        compile_model=False,
+        kernel="auto",
+    ):
+        # Load embedding model (inference only: no dropout, no autograd)
+        self.backend = backend
+        self.model = _load_model(backend)
+        self.model.eval()
 
-        # Storage
-        self.documents = []
-        self.embeddings = []
+        # Optionally let torch.compile fuse the transformer's kernels; the
+        # first few batches pay the compilation cost. dynamic=True because
+        # tokenized sequence lengths vary per batch.
+        if compile_model and backend == "torch":
+            transformer = self.model[0]
+            transformer.auto_model = torch.compile(transformer.auto_model, dynamic=True)
+
+        # Storage, one column per document field (row i of each list and of
+        # self.embeddings describe the same document)
+        self.ids = []
+        self.texts = []
 
         # Embedding dimension
         self.dimension = self.model.get_sentence_embedding_dimension()
 
-    def load_documents(self, path="documents.json"):
+        # Unit-normalized (N, dimension) float32 matrix, one row per document
+        self.embeddings = np.empty((0, self.dimension), dtype=np.float32)
+
+        # Search-time storage: "float32", "float16" or "bfloat16" (half the
+        # bytes streamed per query; bfloat16 needs ml_dtypes) or "int8" (a
+        # quarter; needs the simsimd kernel, otherwise the float32 matrix is
+        # scanned). The float32 matrix stays the source of truth; it is
+        # memory-mapped, so unused pages cost no RAM.
+        if dtype not in ("float32", "float16", "bfloat16", "int8"):
+            raise ValueError(f"Unknown storage dtype: {dtype}")
+        if dtype == "bfloat16" and ml_dtypes is None:
+            raise ValueError("dtype='bfloat16' requires the ml_dtypes package")
+        self.dtype = dtype
+        self.compact_embeddings = None
+
+        # Approximate nearest-neighbour index ("hnsw", "ivf", "pq", "binary",
+        # or None to disable), only built once the corpus reaches
+        # ann_threshold documents; below that a brute-force scan is faster.
+        # For "ivf", nprobe is how many of the ~sqrt(N) clusters each query
+        # scans; for "pq", pq_m is the number of 1-byte codes per vector.
+        if index not in (None, "hnsw", "ivf", "pq", "binary"):
+            raise ValueError(f"Unknown index type: {index}")
+        if index == "pq" and (pq_m <= 0 or self.dimension % pq_m != 0):
+            raise ValueError(
+                f"pq_m must divide the embedding dimension ({self.dimension}), got {pq_m}"
+            )
+        self.index_type = index
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.index = None
+        self.binary_codes = None
+
+        # Brute-force similarity kernel (see _resolve_kernel). Numba compiles
+        # now rather than on the first query.
+        self.kernel = _resolve_kernel(kernel)
+        if self.kernel == "numba":
+            kernels.warm_up(self.dimension)
+
+        # Exact-match memo of query embeddings, keyed by normalized text
+        self._cached_query_embedding = lru_cache(maxsize=4096)(self._embed_query)
+
+        # LRU of search results keyed by a hash of the rounded query vector.
+        # _generation is part of the key and bumped on every reload, so
+        # stale results are never served (they just age out).
+        self._result_cache = OrderedDict()
+        self._result_cache_size = 1024
+        self._result_cache_lock = threading.Lock()
+        self._generation = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load_documents(self, path="documents.json", embeddings_path="embeddings.npy"):
         """
         Load documents from JSON file and create embeddings.
+        Embeddings are saved to embeddings_path (with a small JSON sidecar
+        fingerprinting the texts and model) and memory-mapped on later loads
+        for as long as the fingerprint still matches.
         Expected schema:
         [
           {
@@ -28,39 +240,370 @@ class VectorDB:
         ]
         """
         with open(path, "r", encoding="utf-8") as f:
-            self.documents = json.load(f)
+            documents = json.load(f)
+
+        self.ids = [doc["id"] for doc in documents]
+        self.texts = [doc["data"] for doc in documents]
+
+        self.compact_embeddings = None
+        self.index = None
+        self.binary_codes = None
+        self._generation += 1
+
+        texts = self.texts
+        if not texts:
+            self.embeddings = np.empty((0, self.dimension), dtype=np.float32)
+            return
+
+        fingerprint = self._fingerprint(texts)
+        self.embeddings = self._load_cached_embeddings(embeddings_path, fingerprint)
+        if self.embeddings is None:
+            self.embeddings = self.encode(texts)
+            self._save_cached_embeddings(embeddings_path, fingerprint)
+
+            # Swap the freshly encoded heap copy for a mapping of the file
+            # just written, so even a cold start shares pages with other
+            # workers through the OS page cache
+            mapped = self._load_cached_embeddings(embeddings_path, fingerprint)
+            if mapped is not None:
+                self.embeddings = mapped
 
-        texts = [doc["data"] for doc in self.documents]
-        self.embeddings = self.model.encode(texts, convert_to_numpy=True)
+        if self.dtype == "int8" and self.kernel == "simsimd":
+            self.compact_embeddings = _quantize_int8(self.embeddings)
+        elif self.dtype == "float16":
+            self.compact_embeddings = self.embeddings.astype(np.float16)
+        elif self.dtype == "bfloat16":
+            self.compact_embeddings = self.embeddings.astype(ml_dtypes.bfloat16)
 
-    def search(self, query):
+        self._build_index()
+
+    def _fingerprint(self, texts):
+        """
+        Identifies what a saved matrix was computed from: the exact texts,
+        in order, plus the model and backend that embedded them.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for text in texts:
+            digest.update(text.encode("utf-8"))
+            digest.update(b"\0")
+
+        return {
+            "model": MODEL_NAME,
+            "backend": self.backend,
+            "count": len(texts),
+            "dimension": self.dimension,
+            "texts": digest.hexdigest(),
+        }
+
+    def _load_cached_embeddings(self, embeddings_path, fingerprint):
+        """
+        Memory-map a previously saved matrix if its sidecar fingerprint
+        matches; otherwise return None.
+        """
+        if not embeddings_path or not os.path.exists(embeddings_path):
+            return None
+
+        # A missing/corrupt sidecar or a truncated/foreign .npy just means
+        # re-encoding, never a failed startup
+        try:
+            with open(embeddings_path + ".meta.json", "r", encoding="utf-8") as f:
+                if json.load(f) != fingerprint:
+                    return None
+
+            embeddings = np.load(embeddings_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+        if embeddings.shape != (fingerprint["count"], self.dimension):
+            return None
+        if embeddings.dtype != np.float32:
+            return None
+
+        return embeddings
+
+    def _save_cached_embeddings(self, embeddings_path, fingerprint):
+        if not embeddings_path:
+            return
+
+        # Write then rename so a concurrent reader never maps a partial file.
+        # The sidecar goes last: a matrix without a matching sidecar is ignored.
+        # Persisting is only an optimization: on a read-only or missing
+        # directory, keep serving from the in-memory matrix.
+        tmp_path = f"{embeddings_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, self.embeddings)
+            os.replace(tmp_path, embeddings_path)
+
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(fingerprint, f)
+            os.replace(tmp_path, embeddings_path + ".meta.json")
+        except OSError as e:
+            logger.warning("Could not save embeddings to %s: %s", embeddings_path, e)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _build_index(self):
+        """
+        Build the ANN index over the embeddings when the corpus is large
+        enough. Scores are inner products, which equal cosine for the
+        normalized rows:
+        - "hnsw": navigable small-world graph
+        - "ivf": inverted file; k-means coarse quantizer over ~sqrt(N)
+          clusters, each query scans only the nprobe nearest clusters
+        - "pq": product quantization; each vector stored as pq_m one-byte
+          codes (256 centroids per subspace) and scored by asymmetric
+          distance computation: one per-query lookup table of pq_m x 256
+          partial dot products, then pq_m table lookups per row. Those
+          scores are approximate, so the shortlist is reranked exactly. Only
+          built from PQ_MIN_TRAINING_POINTS documents up, whatever
+          ann_threshold says; smaller corpora train poor codebooks.
+        - "binary": sign bits packed to dimension/8 bytes per row; queries
+          shortlist candidates by Hamming distance and rerank them exactly
+          (plain NumPy, no faiss needed)
+        """
+        if self.index_type is None:
+            return
+        if len(self.embeddings) < self.ann_threshold:
+            return
+
+        if self.index_type == "pq" and len(self.embeddings) < PQ_MIN_TRAINING_POINTS:
+            return
+
+        if self.index_type == "binary":
+            self.binary_codes = np.packbits(self.embeddings > 0, axis=1)
+            return
+
+        if faiss is None:
+            return
+
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dimension, 16, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 200
+            index.hnsw.efSearch = 64
+        elif self.index_type == "ivf":
+            nlist = int(np.sqrt(len(self.embeddings)))
+            quantizer = faiss.IndexFlatIP(self.dimension)
+            index = faiss.IndexIVFFlat(
+                quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(self.embeddings)
+            index.nprobe = self.nprobe
+        elif self.index_type == "pq":
+            index = faiss.IndexPQ(
+                self.dimension, self.pq_m, 8, faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(self.embeddings)
+
+        index.add(self.embeddings)
+        self.index = index
+
+    def encode(self, texts):
+        """
+        Embed a list of texts in padded minibatches (one forward pass per
+        batch rather than per text). Rows are unit-normalized so cosine
+        similarity is a plain dot product.
+        Returns a contiguous (len(texts), dimension) float32 array.
+        """
+        with torch.inference_mode():
+            embeddings = self.model.encode(
+                texts,
+                batch_size=64,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def encode_query(self, query):
+        """
+        Embed a single query. Repeated queries (after lowercasing and
+        collapsing whitespace, which the uncased BGE tokenizer ignores anyway)
+        are served from an in-memory LRU without a forward pass.
+        The returned array is read-only since it is shared between callers.
+        """
+        return self._cached_query_embedding(" ".join(query.lower().split()))
+
+    def _embed_query(self, query):
+        embedding = self.encode([query])[0]
+        embedding.setflags(write=False)
+        return embedding
+
+    def search(self, query, k=3):
         """
         Search documents using cosine similarity.
-        Returns a list of:
+        Returns the top-k matches (highest score first) as a list of:
         {
           id,
           score,
           metadata: { text }
         }
         """
-        if not self.documents:
+        if not self.ids:
+            return []
+
+        return self.search_by_vector(self.encode_query(query), k=k)
+
+    def search_by_vector(self, query_embedding, k=3, query_is_normalized=True):
+        """
+        Same as search(), for a query already embedded with encode_query().
+        Embeddings from encode_query()/encode() are unit length already; pass
+        query_is_normalized=False for vectors from anywhere else.
+        Raises ValueError unless the query has exactly `dimension` components
+        (the Numba kernel has no bounds checks).
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        if query_embedding.shape != (self.dimension,):
+            raise ValueError(
+                f"Query embedding must have shape ({self.dimension},), "
+                f"got {query_embedding.shape}"
+            )
+
+        k = min(k, len(self.ids))
+        if k <= 0:
             return []
 
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
+        if not query_is_normalized:
+            # math.sqrt of a dot is cheaper than np.linalg.norm for one vector;
+            # the epsilon keeps a zero vector from producing NaN scores
+            norm = math.sqrt(float(query_embedding @ query_embedding)) + 1e-8
+            query_embedding = query_embedding / norm
 
-        scores = cosine_similarity(query_embedding, self.embeddings)[0]
+            # Match encode_query()'s read-only arrays so the Numba kernel
+            # reuses its warmed-up specialization
+            query_embedding.setflags(write=False)
 
-        results = []
-        for idx, score in enumerate(scores):
-            results.append({
-                "id": self.documents[idx]["id"],
-                "score": float(score),
+        key = self._result_cache_key(query_embedding, k)
+        with self._result_cache_lock:
+            results = self._result_cache.get(key)
+            if results is not None:
+                self._result_cache.move_to_end(key)
+                return results
+
+        if self.binary_codes is not None:
+            top, top_scores = self._binary_search(query_embedding, k)
+        elif self.index is not None:
+            top, top_scores = self._index_search(query_embedding, k)
+        else:
+            scores = self._similarities(query_embedding)
+            top = _top_k(scores, k)
+            top_scores = scores[top]
+
+        # One tolist() per array converts to Python ints/floats in C instead
+        # of a float(np.float32) round-trip per element
+        results = [
+            {
+                "id": self.ids[idx],
+                "score": score,
                 "metadata": {
-                    "text": self.documents[idx]["data"]
+                    "text": self.texts[idx]
                 }
-            })
+            }
+            for idx, score in zip(np.asarray(top).tolist(), np.asarray(top_scores).tolist())
+        ]
 
-        # Sort by similarity score (highest first)
-        results.sort(key=lambda x: x["score"], reverse=True)
+        with self._result_cache_lock:
+            self._result_cache[key] = results
+            if len(self._result_cache) > self._result_cache_size:
+                self._result_cache.popitem(last=False)
 
         return results
+
+    def _result_cache_key(self, query_embedding, k):
+        # Rounding to 1e-4 lets float noise from equivalent queries collide
+        rounded = np.round(query_embedding * 1e4).astype(np.int32)
+        digest = hashlib.blake2b(rounded.tobytes(), digest_size=16).digest()
+        return (self._generation, k, digest)
+
+    def _index_search(self, query_embedding, k, rerank_factor=10):
+        """
+        Top-k rows and scores from the ANN index, highest first.
+        PQ scores are only approximations, so for "pq" rerank_factor * k
+        candidates are fetched and rescored exactly against the float32 rows.
+        """
+        fetch = rerank_factor * k if self.index_type == "pq" else k
+        scores, labels = self.index.search(query_embedding[np.newaxis, :], fetch)
+
+        # faiss pads with -1 when fewer than k neighbours are reachable
+        found = labels[0] >= 0
+        labels, scores = labels[0][found], scores[0][found]
+
+        if self.index_type == "pq":
+            scores = self.embeddings[labels] @ query_embedding
+            top = _top_k(scores, k)
+            labels, scores = labels[top], scores[top]
+
+        return labels, scores
+
+    def _binary_search(self, query_embedding, k, rerank_factor=10):
+        """
+        Two-stage search: shortlist rerank_factor * k rows by Hamming
+        distance between sign bits (XOR + popcount over dimension/8 bytes per
+        row, 32x less data than float32), then score only the shortlist
+        exactly against the float32 rows.
+        """
+        query_bits = np.packbits(query_embedding > 0)
+        distances = _POPCOUNT[self.binary_codes ^ query_bits].sum(axis=1)
+
+        shortlist_size = min(rerank_factor * k, len(distances))
+        if shortlist_size < len(distances):
+            shortlist = np.argpartition(distances, shortlist_size - 1)[:shortlist_size]
+        else:
+            shortlist = np.arange(len(distances))
+
+        scores = self.embeddings[shortlist] @ query_embedding
+        top = _top_k(scores, k)
+        return shortlist[top], scores[top]
+
+    def _block_rows(self):
+        # Rows per tile so one float32 slab fills (but doesn't spill) L2
+        return max(1, self.l2_cache_bytes // (4 * self.dimension))
+
+    def _similarities(self, query_embedding):
+        """
+        Cosine similarity of a unit-normalized query against every stored row.
+        Dispatches on self.kernel: SimSIMD's AVX-512/AVX2/NEON kernels, a
+        parallel Numba kernel, or a single NumPy GEMV against the
+        pre-normalized matrix.
+        """
+        compact = self.compact_embeddings
+
+        if compact is not None and compact.dtype not in (np.int8, np.float16):
+            # bfloat16: no native kernel on any path
+            return _upcast_scores(compact, query_embedding, self._block_rows())
+
+        if self.kernel == "simsimd":
+            # threads=0 spreads rows over every core, like BLAS does
+            if compact is not None and compact.dtype == np.int8:
+                # The int8 rows carry per-row scales, so use cosine (which is
+                # scale-invariant) rather than a plain dot product
+                distances = simsimd.cdist(
+                    _quantize_int8(query_embedding)[np.newaxis, :],
+                    compact,
+                    metric="cos",
+                    threads=0,
+                )
+                return 1.0 - np.asarray(distances, dtype=np.float32).ravel()
+
+            # float32/float16 rows are unit-normalized: a plain dot product,
+            # no per-row norms
+            if compact is None:
+                matrix, query = self.embeddings, query_embedding
+            else:
+                matrix, query = compact, query_embedding.astype(compact.dtype)
+            scores = simsimd.cdist(query[np.newaxis, :], matrix, metric="dot", threads=0)
+            return np.asarray(scores, dtype=np.float32).ravel()
+
+        if compact is not None:
+            # float16 without simsimd
+            return _upcast_scores(compact, query_embedding, self._block_rows())
+
+        if self.kernel == "numba":
+            scores = np.empty(len(self.embeddings), dtype=np.float32)
+            dot_scores = kernels.dot_scores_for(self.dimension)
+            dot_scores(np.asarray(self.embeddings), query_embedding, scores)
+            return scores
+
+        return self.embeddings @ query_embedding